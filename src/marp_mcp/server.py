@@ -6,11 +6,20 @@ Exposes Marp CLI functionality through the Model Context Protocol.
 """
 
 import asyncio
+import atexit
+import base64
+import hashlib
 import json
 import logging
 import os
-import subprocess
+import re
+import shutil
+import socket
 import tempfile
+import time
+import urllib.request
+import uuid
+from collections import OrderedDict
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
@@ -24,17 +33,217 @@ from mcp.types import (
 )
 from pydantic import BaseModel, Field
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+import yaml
+
+# Configure logging (WARNING keeps per-call chatter off the hot path;
+# set MARP_MCP_LOG_LEVEL=DEBUG to see the commands being run)
+logging.basicConfig(level=os.environ.get("MARP_MCP_LOG_LEVEL", "WARNING"))
 logger = logging.getLogger(__name__)
 
 # Initialize MCP server
 server = Server("marp-mcp-server")
 
+# Cached Marp CLI availability and resolved binary path (None = not
+# probed yet)
+_marp_available: Optional[bool] = None
+_MARP_PATH: Optional[str] = None
+_marp_lock = asyncio.Lock()
+
+# One process-wide scratch directory; per-call files get unique names so
+# we avoid a mkdtemp/rmtree round trip on every tool call
+_WORK_DIR = Path(tempfile.mkdtemp(prefix="marp-mcp-"))
+atexit.register(shutil.rmtree, _WORK_DIR, ignore_errors=True)
+
+# Rendered images above this size skip base64 inlining and are written
+# under the scratch dir instead, returned as a file:// URI
+_INLINE_IMAGE_MAX = int(os.environ.get("MARP_INLINE_IMAGE_MAX", str(2 * 1024 * 1024)))
+_IMAGES_DIR = _WORK_DIR / "images"
+_IMAGES_DIR.mkdir()
+_IMAGE_TTL = 600  # seconds before a served image file is swept
+
+# Bound concurrent Marp subprocesses so parallel tool calls don't each
+# spawn an unthrottled Chromium (tune via MARP_PARALLEL)
+_MARP_CONCURRENCY = int(os.environ.get("MARP_PARALLEL", "5"))
+_marp_sem = asyncio.Semaphore(_MARP_CONCURRENCY)
+
+
+async def _ensure_marp() -> bool:
+    """
+    Check that the Marp CLI is installed, caching the result so the probe
+    only runs once per process. A PATH lookup answers this without
+    forking a Node process; _verify_marp() confirms at startup that the
+    binary actually executes.
+    """
+    global _marp_available, _MARP_PATH
+
+    if _marp_available is not None:
+        return _marp_available
+
+    async with _marp_lock:
+        if _marp_available is None:
+            _MARP_PATH = shutil.which("marp")
+            _marp_available = _MARP_PATH is not None
+        return _marp_available
+
+
+async def _verify_marp() -> None:
+    """Run `marp --version` once at startup to confirm the CLI executes"""
+    global _marp_available
+
+    if not await _ensure_marp():
+        return
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            _MARP_PATH, "--version",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            close_fds=False
+        )
+        await process.communicate()
+        _marp_available = process.returncode == 0
+    except OSError:
+        _marp_available = False
+
+
+# Long-lived Marp server subprocess (None = not running, use per-call CLI)
+_marp_server_proc: Optional[asyncio.subprocess.Process] = None
+_marp_server_port: Optional[int] = None
+_marp_server_dir: Optional[Path] = None
+# Strong reference to the stdout drain task; the loop only keeps weak
+# references, so a bare create_task could be garbage-collected mid-run
+_drain_task: Optional[asyncio.Task] = None
+
+
+def _free_port() -> int:
+    """Ask the OS for an unused local port"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _drain(stream: asyncio.StreamReader) -> None:
+    """Discard subprocess output so its pipe never fills up"""
+    while await stream.readline():
+        pass
+
+
+async def _terminate(process: asyncio.subprocess.Process) -> None:
+    """Terminate a subprocess, escalating to kill after a grace period"""
+    if process.returncode is None:
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            process.kill()
+
+
+async def _start_marp_server() -> None:
+    """
+    Launch a persistent `marp --server` subprocess watching a tmpdir.
+
+    Keeping one server alive amortizes the Node/Chromium startup cost
+    across all requests. If it fails to start, tool calls transparently
+    fall back to spawning the CLI per call.
+    """
+    global _marp_server_proc, _marp_server_port, _marp_server_dir, _drain_task
+
+    if not await _ensure_marp():
+        return
+
+    process = None
+    try:
+        _marp_server_dir = Path(tempfile.mkdtemp(prefix="marp-mcp-server-"))
+        port = _free_port()
+
+        # marp-cli takes the server port from the PORT environment
+        # variable, not a CLI flag
+        process = await asyncio.create_subprocess_exec(
+            _MARP_PATH, "--server", str(_marp_server_dir),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            close_fds=False,
+            env={**os.environ, "PORT": str(port)}
+        )
+
+        async def _wait_ready() -> int:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    raise RuntimeError("Marp server exited during startup")
+                # Trust the announced address over our requested port
+                match = re.search(rb"http://[^\s/:]+:(\d+)", line)
+                if match:
+                    return int(match.group(1))
+
+        bound_port = await asyncio.wait_for(_wait_ready(), timeout=30)
+
+        _marp_server_proc = process
+        _marp_server_port = bound_port
+        _drain_task = asyncio.get_running_loop().create_task(_drain(process.stdout))
+        logger.info(f"Marp server listening on port {bound_port}")
+
+    except Exception as e:
+        logger.warning(f"Could not start Marp server, using per-call CLI: {e}")
+        # Don't leave a half-started Node/Chromium process behind
+        if process is not None:
+            await _terminate(process)
+        _marp_server_proc = None
+        _marp_server_port = None
+
+
+async def _stop_marp_server() -> None:
+    """Shut down the persistent Marp server, if running"""
+    global _marp_server_proc, _drain_task
+
+    if _drain_task is not None:
+        _drain_task.cancel()
+        _drain_task = None
+
+    process = _marp_server_proc
+    _marp_server_proc = None
+
+    if process is not None:
+        await _terminate(process)
+
+    if _marp_server_dir is not None:
+        shutil.rmtree(_marp_server_dir, ignore_errors=True)
+
+
+async def _render_via_server(markdown: str, output_format: str = "html") -> Optional[bytes]:
+    """
+    Render markdown through the persistent Marp server.
+
+    Returns the rendered output bytes, or None if the server is not
+    running or the request failed (callers fall back to the CLI path).
+    """
+    if _marp_server_proc is None or _marp_server_proc.returncode is not None:
+        return None
+
+    token = uuid.uuid4().hex
+    source = _marp_server_dir / f"{token}.md"
+    query = "" if output_format == "html" else f"?{output_format}"
+    url = f"http://127.0.0.1:{_marp_server_port}/{token}.md{query}"
+
+    try:
+        await asyncio.to_thread(source.write_text, markdown)
+
+        def _fetch() -> bytes:
+            with urllib.request.urlopen(url, timeout=60) as response:
+                return response.read()
+
+        return await asyncio.to_thread(_fetch)
+    except Exception as e:
+        logger.warning(f"Marp server request failed, falling back to CLI: {e}")
+        return None
+    finally:
+        await asyncio.to_thread(source.unlink, True)
+
 
 class MarpConvertParams(BaseModel):
     """Parameters for converting Markdown to slides"""
-    markdown: str = Field(..., description="Markdown content with Marp directives")
+    markdown: Optional[str] = Field(None, description="Markdown content with Marp directives")
+    markdowns: Optional[List[str]] = Field(None, description="Multiple markdown documents to convert in one batch")
     output_format: str = Field("html", description="Output format: html, pdf, pptx, png, jpeg")
     theme: Optional[str] = Field(None, description="Theme name: default, gaia, uncover, or custom CSS path")
     options: Optional[Dict[str, Any]] = Field(default_factory=dict, description="Additional Marp CLI options")
@@ -50,37 +259,123 @@ class MarpValidateParams(BaseModel):
     markdown: str = Field(..., description="Markdown content to validate")
 
 
+async def _image_response(content: bytes, output_format: str,
+                          prefix: str = "Successfully generated") -> List[TextContent | ImageContent | EmbeddedResource]:
+    """
+    Build the response for a rendered PNG/JPEG.
+
+    Small images are inlined as base64 ImageContent. Large ones skip the
+    ~33% base64 inflation (and its extra copy) entirely: they are written
+    under the scratch dir and returned as a file:// URI, swept later by
+    the periodic cleanup task.
+    """
+    if len(content) > _INLINE_IMAGE_MAX:
+        path = _IMAGES_DIR / f"{uuid.uuid4().hex}{_EXT_MAP[output_format]}"
+        await asyncio.to_thread(path.write_bytes, content)
+        return [TextContent(
+            type="text",
+            text=f"{prefix} {output_format.upper()} presentation. Available at: file://{path}"
+        )]
+
+    # b64encode is CPU-bound; keep it off the event loop
+    encoded = await asyncio.to_thread(
+        lambda: base64.b64encode(content).decode('ascii')
+    )
+    return [
+        TextContent(
+            type="text",
+            text=f"{prefix} {output_format.upper()} presentation"
+        ),
+        ImageContent(
+            type="image",
+            data=encoded,
+            mimeType=f"image/{output_format}"
+        )
+    ]
+
+
+async def _sweep_images() -> None:
+    """Periodically delete served image files older than _IMAGE_TTL"""
+    while True:
+        await asyncio.sleep(60)
+        cutoff = time.time() - _IMAGE_TTL
+
+        def _sweep():
+            for path in _IMAGES_DIR.iterdir():
+                try:
+                    if path.stat().st_mtime < cutoff:
+                        path.unlink()
+                except OSError:
+                    pass
+
+        await asyncio.to_thread(_sweep)
+
+
+def _validate_frontmatter(markdown: str) -> Optional[str]:
+    """
+    Cheap in-process pre-check of the Marp frontmatter.
+
+    Returns an error message for inputs that can be rejected without
+    shelling out to Marp, or None when the markdown looks plausible and
+    the full CLI validation should run.
+    """
+    if not markdown.strip():
+        return "Markdown content is empty"
+
+    if not markdown.startswith("---\n"):
+        # No frontmatter block; let Marp decide
+        return None
+
+    # Search from index 3 (the opener's own newline) so an empty
+    # frontmatter block ("---\n---\n...") is still seen as closed
+    end = markdown.find("\n---", 3)
+    if end == -1:
+        return "Unterminated YAML frontmatter (missing closing '---')"
+
+    try:
+        front = yaml.safe_load(markdown[4:end])
+    except yaml.YAMLError as e:
+        return f"Invalid YAML frontmatter: {e}"
+
+    if front is not None and not isinstance(front, dict):
+        return "YAML frontmatter must be a mapping"
+
+    return None
+
+
 async def run_marp_command(args: List[str], input_data: Optional[str] = None) -> Dict[str, Any]:
     """
     Execute Marp CLI command and return results
     """
     try:
-        # Ensure marp is available
-        result = subprocess.run(
-            ["marp", "--version"],
-            capture_output=True,
-            text=True,
-            check=False
-        )
-        
-        if result.returncode != 0:
+        # Ensure marp is available (cached after the first probe)
+        if not await _ensure_marp():
             return {
                 "success": False,
                 "error": "Marp CLI not found. Please install it with: npm install -g @marp-team/marp-cli"
             }
-        
+
         # Run the actual command
-        cmd = ["marp"] + args
-        logger.info(f"Running command: {' '.join(cmd)}")
-        
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdin=asyncio.subprocess.PIPE if input_data else None,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
+        cmd = [_MARP_PATH] + args
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Running command: %s", ' '.join(cmd))
         
-        stdout, stderr = await process.communicate(input_data.encode() if input_data else None)
+        async with _marp_sem:
+            # close_fds=False (with no preexec_fn) and an absolute
+            # executable path let CPython use posix_spawn instead of
+            # fork+exec, skipping the page-table copy of this process on
+            # every launch -- a bare program name forces the fork path.
+            # We open no sensitive inheritable fds, so leaking is not a
+            # concern here.
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE if input_data else None,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                close_fds=False
+            )
+
+            stdout, stderr = await process.communicate(input_data.encode() if input_data else None)
         
         if process.returncode == 0:
             return {
@@ -103,271 +398,512 @@ async def run_marp_command(args: List[str], input_data: Optional[str] = None) ->
         }
 
 
-@server.list_tools()
-async def list_tools() -> List[Tool]:
-    """List available Marp tools"""
-    return [
-        Tool(
-            name="marp_convert",
-            description="Convert Markdown to presentation slides using Marp",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "markdown": {
-                        "type": "string",
-                        "description": "Markdown content with Marp directives"
-                    },
-                    "output_format": {
-                        "type": "string",
-                        "enum": ["html", "pdf", "pptx", "png", "jpeg"],
-                        "default": "html",
-                        "description": "Output format for the presentation"
-                    },
-                    "theme": {
-                        "type": "string",
-                        "description": "Theme name (default, gaia, uncover) or path to custom CSS"
-                    },
-                    "options": {
-                        "type": "object",
-                        "description": "Additional Marp CLI options",
-                        "properties": {
-                            "allow_local_files": {"type": "boolean"},
-                            "html": {"type": "boolean"},
-                            "pdf_notes": {"type": "boolean"},
-                            "pdf_outlines": {"type": "boolean"}
-                        }
-                    }
+# Small LRU of recent tool results; identical re-requests (common while
+# iterating on a deck) skip the Marp invocation entirely. PDF/PPTX
+# conversions are not cached because they also write a file to $HOME.
+_CACHE: "OrderedDict[bytes, List[Any]]" = OrderedDict()
+_CACHE_MAX = 64
+
+
+def _cache_key(kind: str, markdown: str, fmt: str = "", theme: Optional[str] = None,
+               options: Optional[Dict[str, Any]] = None) -> bytes:
+    """Build a compact digest of everything that affects the result"""
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in (kind, markdown, fmt, theme or "", json.dumps(options or {}, sort_keys=True)):
+        hasher.update(part.encode())
+        hasher.update(b"\0")
+    return hasher.digest()
+
+
+def _cache_get(key: bytes) -> Optional[List[Any]]:
+    result = _CACHE.get(key)
+    if result is not None:
+        _CACHE.move_to_end(key)
+    return result
+
+
+def _cache_put(key: bytes, value: List[Any]) -> None:
+    _CACHE[key] = value
+    _CACHE.move_to_end(key)
+    while len(_CACHE) > _CACHE_MAX:
+        _CACHE.popitem(last=False)
+
+
+# Output-format extensions and option-name -> CLI-flag mappings used by
+# marp_convert, built once at import
+_EXT_MAP = {
+    "html": ".html",
+    "pdf": ".pdf",
+    "pptx": ".pptx",
+    "png": ".png",
+    "jpeg": ".jpg"
+}
+_OPT_FLAGS = (
+    ("allow_local_files", "--allow-local-files"),
+    ("html", "--html"),
+    ("pdf_notes", "--pdf-notes"),
+    ("pdf_outlines", "--pdf-outlines"),
+)
+
+# Preview report template, formatted per call with the computed values
+_PREVIEW_TMPL = """\
+📊 Presentation Preview:
+- Total slides: {n}
+- Theme: {theme}
+- Format: HTML
+
+Preview generated successfully! The HTML contains all slides.
+To view specific slide #{slide}, open the HTML in a browser.
+"""
+
+# Built-in themes are static; serialize once at import time
+_THEMES_JSON = json.dumps([
+    {"name": "default", "description": "Default Marp theme"},
+    {"name": "gaia", "description": "Gaia theme - gorgeous and modern"},
+    {"name": "uncover", "description": "Uncover theme - clean and minimal"}
+], indent=2)
+
+# Tool schemas are immutable; build them once at import time instead of
+# per listTools request
+_TOOLS: List[Tool] = [
+    Tool(
+        name="marp_convert",
+        description="Convert Markdown to presentation slides using Marp",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "markdown": {
+                    "type": "string",
+                    "description": "Markdown content with Marp directives"
                 },
-                "required": ["markdown"]
-            }
-        ),
-        Tool(
-            name="marp_get_themes",
-            description="Get list of available Marp themes",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "include_builtin": {
-                        "type": "boolean",
-                        "default": True,
-                        "description": "Include built-in themes in the list"
+                "markdowns": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Multiple markdown documents to convert in one batch (alternative to markdown)"
+                },
+                "output_format": {
+                    "type": "string",
+                    "enum": ["html", "pdf", "pptx", "png", "jpeg"],
+                    "default": "html",
+                    "description": "Output format for the presentation"
+                },
+                "theme": {
+                    "type": "string",
+                    "description": "Theme name (default, gaia, uncover) or path to custom CSS"
+                },
+                "options": {
+                    "type": "object",
+                    "description": "Additional Marp CLI options",
+                    "properties": {
+                        "allow_local_files": {"type": "boolean"},
+                        "html": {"type": "boolean"},
+                        "pdf_notes": {"type": "boolean"},
+                        "pdf_outlines": {"type": "boolean"}
                     }
                 }
             }
-        ),
-        Tool(
-            name="marp_validate",
-            description="Validate Marp markdown syntax",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "markdown": {
-                        "type": "string",
-                        "description": "Markdown content to validate"
-                    }
-                },
-                "required": ["markdown"]
+        }
+    ),
+    Tool(
+        name="marp_get_themes",
+        description="Get list of available Marp themes",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "include_builtin": {
+                    "type": "boolean",
+                    "default": True,
+                    "description": "Include built-in themes in the list"
+                }
             }
-        ),
-        Tool(
-            name="marp_preview",
-            description="Generate a preview of the presentation",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "markdown": {
-                        "type": "string",
-                        "description": "Markdown content with Marp directives"
-                    },
-                    "theme": {
-                        "type": "string",
-                        "description": "Theme to use for preview"
-                    },
-                    "slide_number": {
-                        "type": "integer",
-                        "description": "Specific slide to preview (1-indexed)",
-                        "minimum": 1
-                    }
+        }
+    ),
+    Tool(
+        name="marp_validate",
+        description="Validate Marp markdown syntax",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "markdown": {
+                    "type": "string",
+                    "description": "Markdown content to validate"
+                }
+            },
+            "required": ["markdown"]
+        }
+    ),
+    Tool(
+        name="marp_preview",
+        description="Generate a preview of the presentation",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "markdown": {
+                    "type": "string",
+                    "description": "Markdown content with Marp directives"
                 },
-                "required": ["markdown"]
-            }
-        )
-    ]
+                "theme": {
+                    "type": "string",
+                    "description": "Theme to use for preview"
+                },
+                "slide_number": {
+                    "type": "integer",
+                    "description": "Specific slide to preview (1-indexed)",
+                    "minimum": 1
+                }
+            },
+            "required": ["markdown"]
+        }
+    )
+]
 
 
-@server.call_tool()
-async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent | ImageContent | EmbeddedResource]:
-    """Handle tool calls"""
-    
-    if name == "marp_convert":
-        params = MarpConvertParams(**arguments)
-        
-        # Create temporary files
-        with tempfile.TemporaryDirectory() as tmpdir:
-            input_file = Path(tmpdir) / "input.md"
-            input_file.write_text(params.markdown)
-            
-            # Determine output file extension
-            ext_map = {
-                "html": ".html",
-                "pdf": ".pdf",
-                "pptx": ".pptx",
-                "png": ".png",
-                "jpeg": ".jpg"
-            }
-            output_file = Path(tmpdir) / f"output{ext_map.get(params.output_format, '.html')}"
-            
-            # Build Marp command
-            args = [str(input_file), "-o", str(output_file)]
-            
-            if params.theme:
-                args.extend(["--theme", params.theme])
-            
-            # Add additional options
-            if params.options:
-                if params.options.get("allow_local_files"):
-                    args.append("--allow-local-files")
-                if params.options.get("html"):
-                    args.append("--html")
-                if params.options.get("pdf_notes"):
-                    args.append("--pdf-notes")
-                if params.options.get("pdf_outlines"):
-                    args.append("--pdf-outlines")
-            
+@server.list_tools()
+async def list_tools() -> List[Tool]:
+    """List available Marp tools"""
+    return _TOOLS
+
+
+async def _handle_convert(arguments: Dict[str, Any]) -> List[TextContent | ImageContent | EmbeddedResource]:
+    """Handle marp_convert calls"""
+    # Plain dict access: full Pydantic model construction is measurable
+    # overhead per call, and these schemas are tiny (the models remain
+    # as schema documentation)
+    md = arguments.get("markdown")
+    markdowns = arguments.get("markdowns")
+    output_format = arguments.get("output_format", "html")
+    theme = arguments.get("theme")
+    options = arguments.get("options") or {}
+
+    # Batch mode: convert every document with a single Marp invocation
+    # so the Node/Chromium startup is paid once, not per document
+    if markdowns:
+        ext = _EXT_MAP.get(output_format, ".html")
+
+        token = uuid.uuid4().hex
+        in_dir = _WORK_DIR / f"{token}-in"
+        out_dir = _WORK_DIR / f"{token}-out"
+
+        try:
+            in_dir.mkdir()
+            out_dir.mkdir()
+
+            # Submit all input writes to the thread pool in one batch
+            # so the syscalls overlap instead of serializing
+            await asyncio.gather(*(
+                asyncio.to_thread((in_dir / f"input_{i}.md").write_text, markdown)
+                for i, markdown in enumerate(markdowns)
+            ))
+
+            # Directory-in/directory-out conversion is marp-cli's
+            # --input-dir mode (a positional dir rejects -o)
+            args = ["--input-dir", str(in_dir), "-o", str(out_dir), "--parallel", str(_MARP_CONCURRENCY)]
+
+            # A directory output has no extension to infer the conversion
+            # type from, so pass it explicitly (HTML is the default)
+            if output_format in ("png", "jpeg"):
+                args.extend(["--image", output_format])
+            elif output_format in ("pdf", "pptx"):
+                args.append(f"--{output_format}")
+
+            if theme:
+                args.extend(["--theme", theme])
+
+            args.extend(flag for key, flag in _OPT_FLAGS if options.get(key))
+
             result = await run_marp_command(args)
-            
-            if result["success"] and output_file.exists():
-                # Read the output file
-                if params.output_format in ["png", "jpeg"]:
-                    content = output_file.read_bytes()
-                    # Return as base64 encoded image
-                    import base64
-                    encoded = base64.b64encode(content).decode()
-                    return [
-                        TextContent(
+
+            if not result["success"]:
+                return [TextContent(
+                    type="text",
+                    text=f"Error converting markdown batch: {result.get('error', 'Unknown error')}"
+                )]
+
+            contents: List[TextContent | ImageContent | EmbeddedResource] = []
+
+            if output_format in ["png", "jpeg", "html"]:
+                def _load_output(path: Path) -> Optional[bytes]:
+                    try:
+                        return path.read_bytes()
+                    except FileNotFoundError:
+                        return None
+
+                # Likewise batch all output reads into one gather
+                outputs = await asyncio.gather(*(
+                    asyncio.to_thread(_load_output, out_dir / f"input_{i}{ext}")
+                    for i in range(len(markdowns))
+                ))
+
+                for i, data in enumerate(outputs):
+                    if data is None:
+                        contents.append(TextContent(
                             type="text",
-                            text=f"Successfully generated {params.output_format.upper()} presentation"
-                        ),
-                        ImageContent(
-                            type="image",
-                            data=encoded,
-                            mimeType=f"image/{params.output_format}"
-                        )
-                    ]
-                else:
-                    content = output_file.read_text() if params.output_format == "html" else None
-                    
-                    if params.output_format == "html" and content:
-                        return [TextContent(
+                            text=f"Document {i}: no output produced"
+                        ))
+                    elif output_format == "html":
+                        contents.append(TextContent(
                             type="text",
-                            text=f"Successfully generated HTML presentation:\n\n{content}"
-                        )]
+                            text=f"Document {i}: generated HTML presentation:\n\n{data.decode()}"
+                        ))
                     else:
-                        # For PDF and PPTX, save to a known location
-                        save_path = Path.home() / f"marp_output{ext_map[params.output_format]}"
-                        output_file.rename(save_path)
-                        return [TextContent(
-                            type="text",
-                            text=f"Successfully generated {params.output_format.upper()} presentation. Saved to: {save_path}"
-                        )]
+                        contents.extend(await _image_response(
+                            data, output_format, prefix=f"Document {i}: generated"
+                        ))
             else:
-                return [TextContent(
-                    type="text",
-                    text=f"Error converting markdown: {result.get('error', 'Unknown error')}"
-                )]
-    
-    elif name == "marp_get_themes":
-        # List built-in themes
-        themes = [
-            {"name": "default", "description": "Default Marp theme"},
-            {"name": "gaia", "description": "Gaia theme - gorgeous and modern"},
-            {"name": "uncover", "description": "Uncover theme - clean and minimal"}
-        ]
-        
+                # For PDF and PPTX, save to a known location
+                for i in range(len(markdowns)):
+                    output_file = out_dir / f"input_{i}{ext}"
+
+                    if not await asyncio.to_thread(output_file.exists):
+                        contents.append(TextContent(
+                            type="text",
+                            text=f"Document {i}: no output produced"
+                        ))
+                    else:
+                        save_path = Path.home() / f"marp_output_{i}{ext}"
+                        await asyncio.to_thread(shutil.move, str(output_file), str(save_path))
+                        contents.append(TextContent(
+                            type="text",
+                            text=f"Document {i}: generated {output_format.upper()} presentation. Saved to: {save_path}"
+                        ))
+
+            return contents
+        finally:
+            await asyncio.to_thread(shutil.rmtree, in_dir, True)
+            await asyncio.to_thread(shutil.rmtree, out_dir, True)
+
+    if not md:
         return [TextContent(
             type="text",
-            text=f"Available Marp themes:\n{json.dumps(themes, indent=2)}"
+            text="Error converting markdown: provide either 'markdown' or 'markdowns'"
         )]
-    
-    elif name == "marp_validate":
-        params = MarpValidateParams(**arguments)
-        
-        with tempfile.TemporaryDirectory() as tmpdir:
-            input_file = Path(tmpdir) / "validate.md"
-            input_file.write_text(params.markdown)
-            
-            # Try to convert to HTML to validate
-            output_file = Path(tmpdir) / "validate.html"
-            args = [str(input_file), "-o", str(output_file)]
-            
-            result = await run_marp_command(args)
-            
-            if result["success"]:
-                return [TextContent(
+
+    cache_key = None
+    if output_format not in ("pdf", "pptx"):
+        cache_key = _cache_key("convert", md, output_format, theme, options)
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+    # Fast path: render through the persistent Marp server. Themes and
+    # extra options need per-call CLI flags, so those use the fallback.
+    if not theme and not options:
+        rendered = await _render_via_server(md, output_format)
+        if rendered is not None:
+            if output_format in ["png", "jpeg"]:
+                response = await _image_response(rendered, output_format)
+                # file:// responses are swept after _IMAGE_TTL, so only
+                # inline images are safe to cache
+                if any(isinstance(item, ImageContent) for item in response):
+                    _cache_put(cache_key, response)
+                return response
+            elif output_format == "html":
+                response = [TextContent(
                     type="text",
-                    text="✅ Markdown is valid Marp syntax"
+                    text=f"Successfully generated HTML presentation:\n\n{rendered.decode()}"
                 )]
+                _cache_put(cache_key, response)
+                return response
             else:
+                # For PDF and PPTX, save to a known location
+                save_path = Path.home() / f"marp_output{_EXT_MAP[output_format]}"
+                await asyncio.to_thread(save_path.write_bytes, rendered)
                 return [TextContent(
                     type="text",
-                    text=f"❌ Validation failed:\n{result.get('error', 'Unknown error')}"
-                )]
-    
-    elif name == "marp_preview":
-        markdown = arguments.get("markdown", "")
-        theme = arguments.get("theme", "default")
-        slide_number = arguments.get("slide_number")
-        
-        with tempfile.TemporaryDirectory() as tmpdir:
-            input_file = Path(tmpdir) / "preview.md"
-            input_file.write_text(markdown)
-            
-            # Generate HTML preview
-            output_file = Path(tmpdir) / "preview.html"
-            args = [str(input_file), "-o", str(output_file), "--theme", theme]
-            
-            result = await run_marp_command(args)
-            
-            if result["success"] and output_file.exists():
-                html_content = output_file.read_text()
-                
-                # Extract preview information
-                slides_count = html_content.count('<section')
-                
-                preview_info = f"""
-📊 Presentation Preview:
-- Total slides: {slides_count}
-- Theme: {theme}
-- Format: HTML
-                
-Preview generated successfully! The HTML contains all slides.
-To view specific slide #{slide_number or 1}, open the HTML in a browser.
-                """
-                
-                return [TextContent(
-                    type="text",
-                    text=preview_info
+                    text=f"Successfully generated {output_format.upper()} presentation. Saved to: {save_path}"
                 )]
+
+    # Only the output needs a real path; the markdown streams over stdin
+    output_file = _WORK_DIR / f"{uuid.uuid4().hex}{_EXT_MAP.get(output_format, '.html')}"
+
+    try:
+        # Build Marp command
+        args = ["-", "-o", str(output_file)]
+
+        if theme:
+            args.extend(["--theme", theme])
+
+        # Add additional options
+        args.extend(flag for key, flag in _OPT_FLAGS if options.get(key))
+
+        result = await run_marp_command(args, input_data=md)
+
+        if result["success"]:
+            # Marp exiting 0 means the output exists; read it directly
+            if output_format in ["png", "jpeg"]:
+                content = await asyncio.to_thread(output_file.read_bytes)
+                response = await _image_response(content, output_format)
+                # As above: never cache a swept file:// response
+                if any(isinstance(item, ImageContent) for item in response):
+                    _cache_put(cache_key, response)
+                return response
             else:
-                return [TextContent(
-                    type="text",
-                    text=f"Error generating preview: {result.get('error', 'Unknown error')}"
-                )]
-    
+                content = await asyncio.to_thread(output_file.read_text) if output_format == "html" else None
+
+                if output_format == "html" and content:
+                    response = [TextContent(
+                        type="text",
+                        text=f"Successfully generated HTML presentation:\n\n{content}"
+                    )]
+                    _cache_put(cache_key, response)
+                    return response
+                else:
+                    # For PDF and PPTX, save to a known location
+                    save_path = Path.home() / f"marp_output{_EXT_MAP[output_format]}"
+                    await asyncio.to_thread(shutil.move, str(output_file), str(save_path))
+                    return [TextContent(
+                        type="text",
+                        text=f"Successfully generated {output_format.upper()} presentation. Saved to: {save_path}"
+                    )]
+        else:
+            return [TextContent(
+                type="text",
+                text=f"Error converting markdown: {result.get('error', 'Unknown error')}"
+            )]
+    finally:
+        await asyncio.to_thread(output_file.unlink, True)
+
+
+async def _handle_get_themes(arguments: Dict[str, Any]) -> List[TextContent | ImageContent | EmbeddedResource]:
+    """Handle marp_get_themes calls"""
+    return [TextContent(
+        type="text",
+        text=f"Available Marp themes:\n{_THEMES_JSON}"
+    )]
+
+
+async def _handle_validate(arguments: Dict[str, Any]) -> List[TextContent | ImageContent | EmbeddedResource]:
+    """Handle marp_validate calls"""
+    md = arguments.get("markdown", "")
+
+    cache_key = _cache_key("validate", md)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Reject obviously malformed frontmatter in-process before paying
+    # for a full Marp conversion
+    error = _validate_frontmatter(md)
+    if error is not None:
+        return [TextContent(
+            type="text",
+            text=f"❌ Validation failed:\n{error}"
+        )]
+
+    # Try to convert to HTML to validate, streaming in over stdin and
+    # discarding the output on stdout -- no temp files needed
+    result = await run_marp_command(["-", "-o", "-"], input_data=md)
+
+    if result["success"]:
+        response = [TextContent(
+            type="text",
+            text="✅ Markdown is valid Marp syntax"
+        )]
     else:
+        response = [TextContent(
+            type="text",
+            text=f"❌ Validation failed:\n{result.get('error', 'Unknown error')}"
+        )]
+
+    _cache_put(cache_key, response)
+    return response
+
+
+async def _handle_preview(arguments: Dict[str, Any]) -> List[TextContent | ImageContent | EmbeddedResource]:
+    """Handle marp_preview calls"""
+    markdown = arguments.get("markdown", "")
+    theme = arguments.get("theme", "default")
+    slide_number = arguments.get("slide_number")
+
+    cache_key = _cache_key("preview", markdown, str(slide_number or 1), theme)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Fast path: the persistent Marp server renders with the default
+    # theme, so it can serve default-theme previews directly. Only a
+    # slide count is reported, so scan the raw bytes rather than
+    # decoding the whole deck into a str.
+    slides_count = None
+    if theme == "default":
+        rendered = await _render_via_server(markdown)
+        if rendered is not None:
+            slides_count = rendered.count(b'<section')
+
+    if slides_count is None:
+        # Generate HTML preview on stdout, streaming the markdown in
+        # over stdin -- no temp files needed
+        args = ["-", "-o", "-", "--theme", theme]
+
+        result = await run_marp_command(args, input_data=markdown)
+
+        if result["success"]:
+            slides_count = result["stdout"].count('<section')
+        else:
+            return [TextContent(
+                type="text",
+                text=f"Error generating preview: {result.get('error', 'Unknown error')}"
+            )]
+
+    # Extract preview information
+    preview_info = _PREVIEW_TMPL.format(
+        n=slides_count, theme=theme, slide=slide_number or 1
+    )
+
+    response = [TextContent(
+        type="text",
+        text=preview_info
+    )]
+    _cache_put(cache_key, response)
+    return response
+
+
+# Table-driven dispatch: one dict lookup per call instead of a chain of
+# string comparisons; new tools only need an entry here
+_DISPATCH = {
+    "marp_convert": _handle_convert,
+    "marp_get_themes": _handle_get_themes,
+    "marp_validate": _handle_validate,
+    "marp_preview": _handle_preview,
+}
+
+
+@server.call_tool()
+async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent | ImageContent | EmbeddedResource]:
+    """Handle tool calls"""
+    handler = _DISPATCH.get(name)
+
+    if handler is None:
         return [TextContent(
             type="text",
             text=f"Unknown tool: {name}"
         )]
 
+    return await handler(arguments)
 
 async def run_server():
     """Run the MCP server"""
     logger.info("Starting Marp MCP Server...")
-    
-    # Run the server using stdio transport
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(read_stream, write_stream, server.create_initialization_options())
+
+    # Warm the availability cache so the first tool call skips the probe,
+    # and confirm once that the CLI actually runs (not just that it is on
+    # PATH)
+    await _verify_marp()
+
+    # Start the persistent Marp worker (tool calls fall back to the
+    # per-call CLI if this fails)
+    await _start_marp_server()
+
+    # Sweep stale served image files in the background
+    sweeper = asyncio.get_running_loop().create_task(_sweep_images())
+
+    try:
+        # Run the server using stdio transport
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, server.create_initialization_options())
+    finally:
+        sweeper.cancel()
+        await _stop_marp_server()
 
 
 def main():